@@ -0,0 +1,274 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional
+
+from aiohttp import web
+from dotenv import load_dotenv
+
+from bot.search import SEARCH_LIMIT, search_directions
+from bot.tenants import DATA_READY, Tenant
+from bot.utils import (
+    CHANCE_LABELS,
+    DataSnapshot,
+    calculate_total_score,
+    estimate_chance,
+    get_achievements_points,
+    get_direction_info,
+    get_directions_data,
+    get_snapshot
+)
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Константы
+API_HOST = os.getenv("API_HOST", "127.0.0.1")
+API_PORT = int(os.getenv("API_PORT", "8080"))
+API_CACHE_MAX_AGE = 300   # Секунды для заголовка Cache-Control
+MAX_BATCH_SIZE = 1000     # Максимум запросов в одном пакете
+
+_dumps = partial(json.dumps, ensure_ascii=False)
+
+
+# -------------------------------
+# Обработка отдельных запросов пакета
+# -------------------------------
+
+def _check_query(query: Dict[str, Any], required: List[str]) -> None:
+    """Проверяет наличие и типы полей запроса; ошибка — ValueError"""
+    for field in required:
+        if field not in query:
+            raise ValueError(f"Не указано поле '{field}'")
+
+    for field in ("form", "direction"):
+        if field in query and not isinstance(query[field], str):
+            raise ValueError(f"Поле {field} должно быть строкой")
+        # Пустая строка совпала бы с любым направлением
+        if field in query and not query[field].strip():
+            raise ValueError(f"Поле {field} не должно быть пустым")
+
+    for field in ("subjects", "achievements"):
+        value = query.get(field)
+        if value is None and field == "achievements":
+            continue
+        if field in query and not (isinstance(value, list) and all(isinstance(v, str) for v in value)):
+            raise ValueError(f"Поле {field} должно быть списком строк")
+
+    # JSON-число 250.0 допустимо, дробные баллы — нет
+    score = query.get("ege_score")
+    is_integer = isinstance(score, int) or (isinstance(score, float) and score.is_integer())
+    if "ege_score" in query and (isinstance(score, bool) or not (is_integer or isinstance(score, str))):
+        raise ValueError("Поле ege_score должно быть целым числом")
+
+
+def _total_score(query: Dict[str, Any]) -> int:
+    """Конкурсный балл: ЕГЭ + индивидуальные достижения"""
+    achievements = query.get("achievements") or []
+    return calculate_total_score(query["ege_score"], get_achievements_points(achievements))
+
+
+def _chance(total_score: int, info: Dict[str, Any]) -> Dict[str, str]:
+    level = estimate_chance(total_score, info["high_score"], info["mid_score"])
+    return {"level": level, "label": CHANCE_LABELS[level]}
+
+
+def match_query(query: Dict[str, Any], snapshot: Optional[DataSnapshot] = None) -> Dict[str, Any]:
+    """Подходящие направления для формы и предметов (и шансы, если указан балл)"""
+    _check_query(query, ["form", "subjects"])
+    directions = get_directions_data(query["subjects"], query["form"], snapshot)
+    if "ege_score" not in query:
+        return {"directions": [{"direction": d} for d in directions]}
+
+    total_score = _total_score(query)
+    return {
+        "total_score": total_score,
+        "directions": [
+            {
+                "direction": direction,
+                "chance": _chance(total_score, get_direction_info(direction, query["form"], snapshot))
+            }
+            for direction in directions
+        ]
+    }
+
+
+def chance_query(query: Dict[str, Any], snapshot: Optional[DataSnapshot] = None) -> Dict[str, Any]:
+    """Данные направления и шансы поступления для балла абитуриента"""
+    _check_query(query, ["form", "direction", "ege_score"])
+    info = get_direction_info(query["direction"], query["form"], snapshot)
+    total_score = _total_score(query)
+    return {**info, "total_score": total_score, "chance": _chance(total_score, info)}
+
+
+def run_batch(handler: Callable[[Dict[str, Any], Optional[DataSnapshot]], Dict[str, Any]],
+              queries: List[Any], snapshot: Optional[DataSnapshot] = None) -> Dict[str, Any]:
+    """Выполняет пакет запросов; ошибка одного запроса не прерывает остальные"""
+    results = []
+    for query in queries:
+        try:
+            if not isinstance(query, dict):
+                raise ValueError("Запрос должен быть объектом")
+            results.append(handler(query, snapshot))
+        except (TypeError, ValueError) as e:
+            results.append({"error": str(e)})
+    return {"results": results}
+
+
+# -------------------------------
+# HTTP-обработчики
+# -------------------------------
+
+def _error(status: int, message: str) -> web.Response:
+    return web.json_response({"error": message}, status=status, dumps=_dumps)
+
+
+def _json_error(error_class: type, message: str) -> web.HTTPException:
+    return error_class(text=_dumps({"error": message}), content_type="application/json")
+
+
+async def _request_snapshot(request: web.Request) -> DataSnapshot:
+    """Снимок данных для запроса.
+
+    Рядом с ботами — снимок бота из параметра ?tenant= (если бот один,
+    параметр можно не указывать), отдельно — стандартный файл данных.
+    """
+    tenants = request.app["tenants"]
+    if tenants:
+        name = request.query.get("tenant")
+        if name is None and len(tenants) == 1:
+            tenant = tenants[0]
+        else:
+            tenant = next((t for t in tenants if t.name == name), None)
+        if tenant is None:
+            raise _json_error(web.HTTPNotFound, f"Укажите бота: tenant = {', '.join(t.name for t in tenants)}")
+        # Снимок бота обновляет его фоновая задача, здесь файл не читается
+        try:
+            return tenant.get_snapshot()
+        except ValueError as e:
+            raise _json_error(web.HTTPServiceUnavailable, str(e))
+
+    try:
+        return await asyncio.get_running_loop().run_in_executor(None, get_snapshot)
+    except ValueError as e:
+        raise _json_error(web.HTTPServiceUnavailable, str(e))
+
+
+async def _cached_response(request: web.Request,
+                           compute: Callable[[DataSnapshot], Dict[str, Any]]) -> web.Response:
+    """Ответ с ETag по версии снимка данных и запросу; 304 при совпадении"""
+    snapshot = await _request_snapshot(request)
+    body = await request.read()
+
+    digest = hashlib.sha1(f"{snapshot.version}:{request.method}:{request.path_qs}:".encode())
+    digest.update(body)
+    etag = f'"{snapshot.version}-{digest.hexdigest()[:16]}"'
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={API_CACHE_MAX_AGE}"}
+
+    if etag in request.headers.get("If-None-Match", ""):
+        return web.Response(status=304, headers=headers)
+
+    payload = await asyncio.get_running_loop().run_in_executor(None, compute, snapshot)
+    return web.json_response(payload, headers=headers, dumps=_dumps)
+
+
+async def _read_queries(request: web.Request) -> List[Any]:
+    """Читает список запросов пакета из тела {"queries": [...]}"""
+    try:
+        data = await request.json()
+    except json.JSONDecodeError:
+        data = None
+
+    queries = data.get("queries") if isinstance(data, dict) else None
+    if not isinstance(queries, list):
+        raise _json_error(web.HTTPBadRequest, "Ожидается JSON с полем queries (список запросов)")
+    if len(queries) > MAX_BATCH_SIZE:
+        raise _json_error(web.HTTPBadRequest, f"Не более {MAX_BATCH_SIZE} запросов в пакете")
+    return queries
+
+
+async def health(request: web.Request) -> web.Response:
+    tenants = request.app["tenants"]
+    if tenants:
+        # Рядом с ботами: состояние фоновой загрузки данных каждого бота;
+        # работа на прежних данных после ошибки чтения — degraded
+        states = {tenant.name: tenant.health() for tenant in tenants}
+        if all(state["state"] == DATA_READY for state in states.values()):
+            status = "ok"
+        elif all(tenant.has_data for tenant in tenants):
+            status = "degraded"
+        else:
+            status = "unavailable"
+        return web.json_response(
+            {"status": status, "tenants": states},
+            status=200 if status == "ok" else 503,
+            dumps=_dumps
+        )
+
+    try:
+        snapshot = await asyncio.get_running_loop().run_in_executor(None, get_snapshot)
+    except ValueError as e:
+        return _error(503, str(e))
+    return web.json_response({"status": "ok", "version": snapshot.version}, dumps=_dumps)
+
+
+async def search(request: web.Request) -> web.Response:
+    query = request.query.get("q", "")
+    try:
+        limit = max(1, min(int(request.query.get("limit", SEARCH_LIMIT)), 50))
+    except ValueError:
+        return _error(400, "limit должен быть числом")
+
+    return await _cached_response(request, lambda snapshot: {
+        "results": [entry._asdict() for entry in search_directions(query, limit, snapshot)]
+    })
+
+
+async def match(request: web.Request) -> web.Response:
+    queries = await _read_queries(request)
+    return await _cached_response(request, lambda snapshot: run_batch(match_query, queries, snapshot))
+
+
+async def chance(request: web.Request) -> web.Response:
+    queries = await _read_queries(request)
+    return await _cached_response(request, lambda snapshot: run_batch(chance_query, queries, snapshot))
+
+
+async def metrics(request: web.Request) -> web.Response:
+    """Счётчики обновлений по ботам, запущенным в этом процессе"""
+    return web.json_response({
+        tenant.name: dict(tenant.metrics) for tenant in request.app["tenants"]
+    }, dumps=_dumps)
+
+
+def create_app(tenants: Optional[List[Tenant]] = None) -> web.Application:
+    """Приложение HTTP API поверх тех же данных и кэшей, что и бот"""
+    app = web.Application()
+    app["tenants"] = tenants or []
+    app.add_routes([
+        web.get("/api/health", health),
+        web.get("/api/metrics", metrics),
+        web.get("/api/search", search),
+        web.post("/api/match", match),
+        web.post("/api/chance", chance),
+    ])
+    return app
+
+
+async def start_api(host: str = API_HOST, port: int = API_PORT,
+                    tenants: Optional[List[Tenant]] = None) -> web.AppRunner:
+    """Запускает API в текущем цикле событий (например, рядом с ботами)"""
+    runner = web.AppRunner(create_app(tenants))
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    logger.info(f"HTTP API запущен на http://{host}:{port}")
+    return runner
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    web.run_app(create_app(), host=API_HOST, port=API_PORT)
@@ -0,0 +1,341 @@
+"""Пакетная обработка списка абитуриентов.
+
+Запуск:
+    python -m bot.batch roster.csv -o results.csv [--chunk-size 5000] [--workers 4]
+
+Входной файл (CSV или XLSX) содержит столбцы form / «Форма обучения»,
+subjects / «Предметы», ege_score / «Баллы ЕГЭ», необязательные
+achievements / «Достижения» (ключи attestat_diplom, gto) и id.
+Предметы разделяются запятой, точкой с запятой, «/» или пробелом
+(«Профильная математика Информатика»); нераспознанный предмет — ошибка строки.
+Результат — CSV, по строке на каждое подходящее направление абитуриента;
+абитуриенты без подходящих направлений получают строку с chance = no_match,
+строки с ошибками — строку с текстом ошибки в error.
+"""
+import argparse
+import logging
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, FrozenSet, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+from openpyxl import load_workbook
+
+from bot.utils import (
+    CHANCE_LABELS,
+    calculate_total_score,
+    extract_required_subjects,
+    find_matching_subjects,
+    get_achievements_points,
+    get_snapshot,
+    normalize_form,
+    normalize_subject_name
+)
+
+logger = logging.getLogger(__name__)
+
+# Константы
+DEFAULT_CHUNK_SIZE = 5000
+
+COLUMN_ALIASES = {
+    "id": ("id", "№"),
+    "form": ("form", "форма обучения", "форма"),
+    "subjects": ("subjects", "предметы"),
+    "ege_score": ("ege_score", "баллы егэ", "балл егэ"),
+    "achievements": ("achievements", "достижения")
+}
+
+# Предметы ЕГЭ после normalize_subject_name
+KNOWN_SUBJECTS = frozenset({
+    "профильная математика", "базовая математика", "математика", "русский язык",
+    "информатика", "физика", "химия", "биология", "история", "обществознание",
+    "иностранный язык", "литература", "география"
+})
+
+NO_MATCH = "no_match"
+NO_MATCH_LABEL = "❌ Направления не найдены"
+
+OUTPUT_COLUMNS = ["id", "form", "total_score", "direction", "chance", "chance_label", "error"]
+
+
+# -------------------------------
+# Векторизованный подбор
+# -------------------------------
+
+class FormMatcher:
+    """Подбор направлений и шансов сразу для многих абитуриентов одной формы"""
+
+    def __init__(self, df: pd.DataFrame):
+        self.directions = np.array([str(d) for d in df["Направление"]], dtype=object)
+        self._required = [extract_required_subjects(str(row.get("Предметы", "-"))) for _, row in df.iterrows()]
+        self._high = self._thresholds(df, "Высокие")
+        self._mid = self._thresholds(df, "Средние")
+        self._hits: Dict[str, np.ndarray] = {}
+
+    @staticmethod
+    def _thresholds(df: pd.DataFrame, column: str) -> np.ndarray:
+        if column not in df.columns:
+            return np.zeros(len(df))
+        return pd.to_numeric(df[column], errors="coerce").to_numpy(dtype=float)
+
+    def _subject_hits(self, subject: str) -> np.ndarray:
+        """Для каких направлений предмет совпадает с одним из требуемых"""
+        if subject not in self._hits:
+            self._hits[subject] = np.array(
+                [bool(find_matching_subjects({subject}, required)) for required in self._required],
+                dtype=np.int32
+            )
+        return self._hits[subject]
+
+    def match(self, subjects: List[FrozenSet[str]]) -> np.ndarray:
+        """Матрица (абитуриенты × направления): направление подходит"""
+        vocabulary = sorted(set().union(*subjects))
+        positions = {subject: i for i, subject in enumerate(vocabulary)}
+
+        selected = np.zeros((len(subjects), len(vocabulary)), dtype=np.int32)
+        for row, applicant_subjects in enumerate(subjects):
+            selected[row, [positions[s] for s in applicant_subjects]] = 1
+
+        hits = np.array([self._subject_hits(s) for s in vocabulary], dtype=np.int32)
+        hits = hits.reshape(len(vocabulary), len(self.directions))
+        math = np.array(["математика" in s for s in vocabulary], dtype=bool)
+
+        # Как в get_directions_data: минимум 2 совпавших предмета, среди них математика
+        matched_count = selected @ hits
+        math_count = selected[:, math] @ hits[math]
+        return (matched_count >= 2) & (math_count > 0)
+
+    def chances(self, total_scores: np.ndarray) -> np.ndarray:
+        """Матрица (абитуриенты × направления) уровней шансов, как estimate_chance"""
+        scores = total_scores[:, None]
+        levels = np.where(scores >= self._high, "high", np.where(scores >= self._mid, "medium", "low"))
+        unknown = np.isnan(self._high) | np.isnan(self._mid)
+        return np.where(unknown, "unknown", levels).astype(object)
+
+
+_matchers: Optional[Dict[str, FormMatcher]] = None
+
+
+def get_matchers() -> Dict[str, FormMatcher]:
+    """Матчеры всех форм обучения (по одному набору на процесс)"""
+    global _matchers
+    if _matchers is None:
+        snapshot = get_snapshot()
+        _matchers = {form: FormMatcher(df) for form, df in snapshot.sheets.items()}
+    return _matchers
+
+
+# -------------------------------
+# Обработка частей списка
+# -------------------------------
+
+def _parse_subject_words(words: List[str]) -> List[str]:
+    """Разбирает слова на предметы: сначала двухсловные названия, затем однословные"""
+    subjects = []
+    position = 0
+    while position < len(words):
+        pair = normalize_subject_name(" ".join(words[position:position + 2]))
+        if position + 1 < len(words) and " " in pair and pair in KNOWN_SUBJECTS:
+            subjects.append(pair)
+            position += 2
+            continue
+
+        subject = normalize_subject_name(words[position])
+        if subject not in KNOWN_SUBJECTS:
+            raise ValueError(f"Неизвестный предмет: {words[position]}")
+        subjects.append(subject)
+        position += 1
+    return subjects
+
+
+@lru_cache(maxsize=8192)
+def _split_subjects(value) -> FrozenSet[str]:
+    """Предметы из ячейки; одинаковые ячейки в списке встречаются часто"""
+    subjects = set()
+    if isinstance(value, str):
+        for part in re.split(r'[,;/]+', value):
+            subjects.update(_parse_subject_words(part.split()))
+    if not subjects:
+        raise ValueError("Не указаны предметы")
+    return frozenset(subjects)
+
+
+def _split_achievements(value) -> List[str]:
+    if not isinstance(value, str):
+        return []
+    return [part for part in re.split(r'[,;\s]+', value.strip()) if part]
+
+
+def score_chunk(chunk: pd.DataFrame, start: int) -> pd.DataFrame:
+    """Оценивает часть списка.
+
+    start — число абитуриентов в предыдущих частях; без столбца id
+    абитуриенты нумеруются по порядку с 1 (пустые строки файла не считаются).
+    """
+    matchers = get_matchers()
+    ids = chunk["id"].tolist() if "id" in chunk.columns else list(range(start + 1, start + len(chunk) + 1))
+
+    rows_by_form: Dict[str, List[int]] = {}
+    subjects: List[FrozenSet[str]] = []
+    totals = np.zeros(len(chunk))
+    errors: Dict[int, str] = {}
+
+    for position, row in enumerate(chunk.itertuples(index=False)):
+        subjects.append(frozenset())
+        try:
+            subjects[position] = _split_subjects(getattr(row, "subjects", None))
+            form = normalize_form(str(getattr(row, "form", "")))
+            if not form or form not in matchers:
+                raise ValueError(f"Неизвестная форма обучения: {getattr(row, 'form', '')}")
+            totals[position] = calculate_total_score(
+                getattr(row, "ege_score", None),
+                get_achievements_points(_split_achievements(getattr(row, "achievements", None)))
+            )
+            rows_by_form.setdefault(form, []).append(position)
+        except ValueError as e:
+            errors[position] = str(e)
+
+    parts = []
+    for form, positions in rows_by_form.items():
+        matcher = matchers[form]
+        positions = np.array(positions)
+        matched = matcher.match([subjects[p] for p in positions])
+        levels = matcher.chances(totals[positions])
+
+        applicant, direction = np.nonzero(matched)
+        chance = levels[applicant, direction]
+        parts.append(pd.DataFrame({
+            "_position": positions[applicant],
+            "form": form,
+            "total_score": totals[positions[applicant]].astype(int),
+            "direction": matcher.directions[direction],
+            "chance": chance,
+            "chance_label": [CHANCE_LABELS[level] for level in chance],
+            "error": ""
+        }))
+
+        # Абитуриент без подходящих направлений всё равно получает строку
+        unmatched = positions[~matched.any(axis=1)]
+        if len(unmatched):
+            parts.append(pd.DataFrame({
+                "_position": unmatched,
+                "form": form,
+                "total_score": totals[unmatched].astype(int),
+                "direction": "",
+                "chance": NO_MATCH,
+                "chance_label": NO_MATCH_LABEL,
+                "error": ""
+            }))
+
+    if errors:
+        parts.append(pd.DataFrame({
+            "_position": list(errors),
+            "form": [chunk["form"].iloc[p] if "form" in chunk.columns else "" for p in errors],
+            "error": list(errors.values())
+        }))
+
+    if not parts:
+        return pd.DataFrame(columns=OUTPUT_COLUMNS)
+
+    result = pd.concat(parts, ignore_index=True).sort_values("_position", kind="stable")
+    result["id"] = [ids[p] for p in result["_position"]]
+    result["total_score"] = result["total_score"].astype("Int64")
+    return result.reindex(columns=OUTPUT_COLUMNS)
+
+
+# -------------------------------
+# Чтение и запись файлов
+# -------------------------------
+
+def _normalize_columns(chunk: pd.DataFrame) -> pd.DataFrame:
+    renames = {}
+    for column in chunk.columns:
+        key = str(column).strip().lower()
+        for name, aliases in COLUMN_ALIASES.items():
+            if key in aliases:
+                renames[column] = name
+    return chunk.rename(columns=renames)
+
+
+def read_roster(path: Path, chunk_size: int, sep: str = ",") -> Iterator[pd.DataFrame]:
+    """Читает CSV/XLSX частями, не загружая файл целиком"""
+    if path.suffix.lower() in (".xlsx", ".xlsm"):
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [str(cell).strip() if cell is not None else "" for cell in next(rows, ())]
+            batch = []
+            for values in rows:
+                if any(value is not None for value in values):
+                    batch.append(values)
+                if len(batch) == chunk_size:
+                    yield _normalize_columns(pd.DataFrame(batch, columns=header))
+                    batch = []
+            if batch:
+                yield _normalize_columns(pd.DataFrame(batch, columns=header))
+        finally:
+            workbook.close()
+    else:
+        for chunk in pd.read_csv(path, chunksize=chunk_size, dtype=str, sep=sep):
+            yield _normalize_columns(chunk)
+
+
+def process_roster(input_path: Path, output_path: Path, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                   workers: int = 1, sep: str = ",") -> int:
+    """Оценивает весь список и пишет результат по мере готовности частей.
+
+    Возвращает число обработанных абитуриентов.
+    """
+    # Данные загружаются до запуска процессов, чтобы при fork их не читать заново
+    get_matchers()
+    processed = 0
+
+    with open(output_path, "w", encoding="utf-8-sig", newline="") as output:
+        pd.DataFrame(columns=OUTPUT_COLUMNS).to_csv(output, index=False)
+        chunks = read_roster(input_path, chunk_size, sep)
+
+        if workers <= 1:
+            for chunk in chunks:
+                score_chunk(chunk, processed).to_csv(output, header=False, index=False)
+                processed += len(chunk)
+                logger.info(f"Обработано абитуриентов: {processed}")
+            return processed
+
+        # Ограничиваем число частей в работе, чтобы память не росла с размером файла
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for chunk in chunks:
+                pending.append(pool.submit(score_chunk, chunk, processed))
+                processed += len(chunk)
+                if len(pending) >= workers * 2:
+                    pending.popleft().result().to_csv(output, header=False, index=False)
+            while pending:
+                pending.popleft().result().to_csv(output, header=False, index=False)
+
+    logger.info(f"Обработано абитуриентов: {processed}")
+    return processed
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Оценка списка абитуриентов по всем направлениям")
+    parser.add_argument("input", type=Path, help="CSV или XLSX со списком абитуриентов")
+    parser.add_argument("-o", "--output", type=Path, default=Path("results.csv"), help="CSV с результатами")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Строк в одной части")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Число процессов")
+    parser.add_argument("--sep", default=",", help="Разделитель столбцов CSV")
+    args = parser.parse_args(argv)
+
+    if not args.input.exists():
+        parser.error(f"Файл {args.input} не найден")
+
+    process_roster(args.input, args.output, args.chunk_size, args.workers, args.sep)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
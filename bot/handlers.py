@@ -1,5 +1,10 @@
+import asyncio
 from aiogram import Router, F
-from aiogram.types import CallbackQuery, Message, InlineKeyboardMarkup, InlineKeyboardButton
+from aiogram.filters import Command, CommandObject
+from aiogram.types import (
+    CallbackQuery, Message, InlineKeyboardMarkup, InlineKeyboardButton,
+    InlineQuery, InlineQueryResultArticle, InputTextMessageContent
+)
 from aiogram.fsm.storage.memory import MemoryStorage
 from typing import Dict, List, Optional
 import logging 
@@ -10,8 +15,13 @@ from bot.utils import (
     get_directions_data,
     calculate_total_score,
     validate_user_score,
-    get_achievements_points
+    get_achievements_points,
+    extract_direction_code,
+    render_direction_cards,
+    DataSnapshot
 )
+from bot.search import search_directions, format_direction_entry
+from bot.tenants import Tenant
 logger = logging.getLogger(__name__)
 router = Router()
 storage = MemoryStorage()
@@ -26,14 +36,19 @@ STAGE_EGE_SCORE = "ege_score"
 STAGE_ACHIEVEMENTS = "achievements"
 STAGE_RESULTS = "results"
 
-user_data = {}  # user_id -> { stage, form, subjects, ege_score, achievements }
+# Сессии пользователей хранятся в tenant.user_data:
+# user_id -> { stage, form, subjects, ege_score, achievements, cards, cards_version }
+_prefetch_tasks = set()  # Ссылки на фоновые задачи, чтобы их не собрал GC
+
+INLINE_CACHE_TIME = 300  # Секунды, на которые Telegram кэширует ответ inline-режима
 
 # -------------------------------
 # Команда /start
 # -------------------------------
 
 @router.message(F.text == "/start")
-async def start_command(message: Message):
+async def start_command(message: Message, tenant: Tenant):
+    user_data = tenant.user_data
     user_id = message.from_user.id
     user_data[user_id] = {
         "stage": STAGE_FORM,
@@ -42,23 +57,70 @@ async def start_command(message: Message):
     }
     await message.answer(
         "🎓 Я помогу вам найти подходящие направления.\n\nВыберите форму обучения:",
-        reply_markup=BotKeyboards.get_form_keyboard()
+        reply_markup=BotKeyboards.get_form_keyboard(forms=tenant.forms)
     )
 
+# -------------------------------
+# Поиск направлений: /find и inline-режим
+# -------------------------------
+
+@router.message(Command("find"), flags={"needs_data": True})
+async def find_command(message: Message, command: CommandObject, tenant: Tenant):
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer("🔎 Укажите запрос, например: /find информатика")
+        return
+
+    try:
+        results = search_directions(query, snapshot=tenant.get_snapshot())
+    except ValueError as e:
+        await message.answer(f"❌ {str(e)}")
+        return
+
+    if not results:
+        await message.answer("😕 По запросу ничего не найдено")
+        return
+
+    await message.answer("\n\n".join(format_direction_entry(entry) for entry in results))
+
+@router.inline_query(flags={"needs_data": True})
+async def inline_search(inline_query: InlineQuery, tenant: Tenant):
+    try:
+        results = search_directions(inline_query.query, snapshot=tenant.get_snapshot())
+    except ValueError as e:
+        logger.error(f"Ошибка inline-поиска: {str(e)}")
+        results = ()
+
+    articles = [
+        InlineQueryResultArticle(
+            id=entry.code,
+            title=entry.name,
+            description=f"{', '.join(entry.forms)}\n{entry.subjects}",
+            input_message_content=InputTextMessageContent(
+                message_text=format_direction_entry(entry),
+                parse_mode="HTML"
+            )
+        )
+        for entry in results
+    ]
+    await inline_query.answer(articles, cache_time=INLINE_CACHE_TIME, is_personal=False)
+
 # -------------------------------
 # Выбор формы обучения
 # -------------------------------
 
 @router.callback_query(F.data.startswith("form:"))
-async def select_form(callback: CallbackQuery):
+async def select_form(callback: CallbackQuery, tenant: Tenant):
+    user_data = tenant.user_data
     form = callback.data.split(":")[1]
     user_id = callback.from_user.id
     user_data[user_id]["form"] = form
-    keyboard = BotKeyboards.get_form_keyboard(selected_form=form)
+    keyboard = BotKeyboards.get_form_keyboard(selected_form=form, forms=tenant.forms)
     await callback.message.edit_reply_markup(reply_markup=keyboard)
 
 @router.callback_query(F.data == "confirm_form")
-async def confirm_form(callback: CallbackQuery):
+async def confirm_form(callback: CallbackQuery, tenant: Tenant):
+    user_data = tenant.user_data
     user_id = callback.from_user.id
     selected_form = user_data[user_id].get("form")
     if not selected_form:
@@ -66,7 +128,7 @@ async def confirm_form(callback: CallbackQuery):
         return
     user_data[user_id]["stage"] = STAGE_SUBJECTS
     text = "📘 Выберите дополнительные предметы (минимум 1):"
-    keyboard = BotKeyboards.get_subjects_keyboard()
+    keyboard = BotKeyboards.get_subjects_keyboard(subjects=tenant.subjects)
     await callback.message.edit_text(text, reply_markup=keyboard)
 
 # -------------------------------
@@ -74,7 +136,8 @@ async def confirm_form(callback: CallbackQuery):
 # -------------------------------
 
 @router.callback_query(F.data.startswith("subject:"))
-async def select_subject(callback: CallbackQuery):
+async def select_subject(callback: CallbackQuery, tenant: Tenant):
+    user_data = tenant.user_data
     subject = callback.data.split(":")[1]
     user_id = callback.from_user.id
     subjects = user_data[user_id]["subjects"]
@@ -87,11 +150,12 @@ async def select_subject(callback: CallbackQuery):
             return
         subjects.append(subject)
 
-    keyboard = BotKeyboards.get_subjects_keyboard(selected_subjects=subjects)
+    keyboard = BotKeyboards.get_subjects_keyboard(selected_subjects=subjects, subjects=tenant.subjects)
     await callback.message.edit_reply_markup(reply_markup=keyboard)
 
 @router.callback_query(F.data == "confirm_subjects")
-async def confirm_subjects(callback: CallbackQuery):
+async def confirm_subjects(callback: CallbackQuery, tenant: Tenant):
+    user_data = tenant.user_data
     user_id = callback.from_user.id
     subjects = user_data[user_id]["subjects"]
     if not subjects:
@@ -105,7 +169,8 @@ async def confirm_subjects(callback: CallbackQuery):
 # -------------------------------
 
 @router.message(F.text)
-async def process_ege_score(message: Message):
+async def process_ege_score(message: Message, tenant: Tenant):
+    user_data = tenant.user_data
     user_id = message.from_user.id
     if user_data.get(user_id, {}).get("stage") != STAGE_EGE_SCORE:
         return
@@ -127,7 +192,8 @@ async def process_ege_score(message: Message):
 # -------------------------------
 
 @router.callback_query(F.data.startswith("achievement:"))
-async def select_achievement(callback: CallbackQuery):
+async def select_achievement(callback: CallbackQuery, tenant: Tenant):
+    user_data = tenant.user_data
     achievement = callback.data.split(":")[1]
     user_id = callback.from_user.id
 
@@ -141,8 +207,9 @@ async def select_achievement(callback: CallbackQuery):
     keyboard = BotKeyboards.get_achievements_keyboard(selected_achievements=current_achievements)
     await callback.message.edit_reply_markup(reply_markup=keyboard)
 
-@router.callback_query(F.data == "confirm_achievements")
-async def confirm_achievements(callback: CallbackQuery):
+@router.callback_query(F.data == "confirm_achievements", flags={"needs_data": True})
+async def confirm_achievements(callback: CallbackQuery, tenant: Tenant):
+    user_data = tenant.user_data
     user_id = callback.from_user.id
     try:
         # Проверяем наличие всех необходимых данных
@@ -165,7 +232,8 @@ async def confirm_achievements(callback: CallbackQuery):
         user_data[user_id]["stage"] = STAGE_RESULTS
 
         # Получаем направления
-        directions = get_directions_data(subjects, form)
+        snapshot = tenant.get_snapshot()
+        directions = get_directions_data(subjects, form, snapshot)
         if not directions:
             await callback.message.edit_text(
                 "😕 Подходящих направлений не найдено",
@@ -174,7 +242,10 @@ async def confirm_achievements(callback: CallbackQuery):
             return
 
         user_data[user_id]["directions"] = directions
+        user_data[user_id]["cards"] = {}
+        user_data[user_id]["cards_version"] = snapshot.version
         keyboard = BotKeyboards.get_directions_keyboard(directions)
+        schedule_cards_prefetch(tenant, user_id)
         await callback.message.edit_text(
             "🎯 Подходящие направления:",
             reply_markup=keyboard
@@ -187,17 +258,67 @@ async def confirm_achievements(callback: CallbackQuery):
 # -------------------------------
 # Просмотр информации о направлении
 # -------------------------------
-@router.callback_query(F.data.startswith("direction:"))
-async def direction_details(callback: CallbackQuery):
+
+def get_session_cards(session: dict, snapshot: DataSnapshot) -> dict:
+    """Карточки сессии для снимка данных; после обновления данных кэш сбрасывается"""
+    if session.get("cards_version") != snapshot.version:
+        session["cards"] = {}
+        session["cards_version"] = snapshot.version
+    return session["cards"]
+
+
+async def prefetch_direction_cards(tenant: Tenant, user_id: int) -> None:
+    """Заранее готовит карточки направлений из списка для балла пользователя"""
+    user_data = tenant.user_data
+    session = user_data.get(user_id)
+    if not session or "total_score" not in session or not tenant.has_data:
+        return
+
+    snapshot = tenant.get_snapshot()
+    cards = get_session_cards(session, snapshot)
+    missing = [d for d in session.get("directions", []) if extract_direction_code(d) not in cards]
+    if not missing:
+        return
+
+    try:
+        rendered = await asyncio.to_thread(
+            render_direction_cards, missing, session["total_score"], session["form"], snapshot
+        )
+    except Exception as e:
+        logger.error(f"Ошибка подготовки карточек направлений: {e}", exc_info=True)
+        return
+
+    # Сессия могла смениться, пока карточки готовились
+    if user_data.get(user_id) is session and session.get("cards") is cards:
+        cards.update(rendered)
+
+
+def schedule_cards_prefetch(tenant: Tenant, user_id: int) -> None:
+    task = asyncio.create_task(prefetch_direction_cards(tenant, user_id))
+    _prefetch_tasks.add(task)
+    task.add_done_callback(_prefetch_tasks.discard)
+
+
+@router.callback_query(F.data.startswith("direction:"), flags={"needs_data": True})
+async def direction_details(callback: CallbackQuery, tenant: Tenant):
+    user_data = tenant.user_data
     try:
         user_id = callback.from_user.id
         direction_code = callback.data.split(":", 1)[1].strip()
 
-        details = calculate_chance(
-            user_data[user_id]["total_score"],
-            direction_code,
-            user_data[user_id]["form"]
-        )
+        snapshot = tenant.get_snapshot()
+        cards = get_session_cards(user_data[user_id], snapshot)
+        details = cards.get(direction_code)
+        if details is None:
+            details = calculate_chance(
+                user_data[user_id]["total_score"],
+                direction_code,
+                user_data[user_id]["form"],
+                snapshot
+            )
+            # Карточка ещё не готова (например, данные обновились) — готовим остальные в фоне
+            cards[direction_code] = details
+            schedule_cards_prefetch(tenant, user_id)
 
         await callback.message.edit_text(details, reply_markup=BotKeyboards.get_direction_details_keyboard(), parse_mode="HTML")
     except ValueError as e:
@@ -211,23 +332,26 @@ async def direction_details(callback: CallbackQuery):
 # -------------------------------
 
 @router.callback_query(F.data == "back_to_form")
-async def back_to_form(callback: CallbackQuery):
+async def back_to_form(callback: CallbackQuery, tenant: Tenant):
+    user_data = tenant.user_data
     user_id = callback.from_user.id
     user_data.pop(user_id, None)
-    await start_command(callback.message)
+    await start_command(callback.message, tenant)
 
 @router.callback_query(F.data == "back_to_subjects")
-async def back_to_subjects(callback: CallbackQuery):
+async def back_to_subjects(callback: CallbackQuery, tenant: Tenant):
+    user_data = tenant.user_data
     user_id = callback.from_user.id
     user_data[user_id]["stage"] = STAGE_SUBJECTS
     subjects = user_data[user_id].get("subjects", [])
     await callback.message.edit_text(
         "📘 Выберите дополнительные предметы (минимум 1):",
-        reply_markup=BotKeyboards.get_subjects_keyboard(selected_subjects=subjects)
+        reply_markup=BotKeyboards.get_subjects_keyboard(selected_subjects=subjects, subjects=tenant.subjects)
     )
 
 @router.callback_query(F.data == "back_to_achievements")
-async def back_to_achievements(callback: CallbackQuery):
+async def back_to_achievements(callback: CallbackQuery, tenant: Tenant):
+    user_data = tenant.user_data
     user_id = callback.from_user.id
     user_data[user_id]["stage"] = STAGE_ACHIEVEMENTS
     await callback.message.edit_text(
@@ -236,17 +360,23 @@ async def back_to_achievements(callback: CallbackQuery):
     )
 
 @router.callback_query(F.data == "back_to_directions")
-async def back_to_directions(callback: CallbackQuery):
+async def back_to_directions(callback: CallbackQuery, tenant: Tenant):
+    user_data = tenant.user_data
     user_id = callback.from_user.id
     user_data[user_id]["stage"] = STAGE_RESULTS
     directions = user_data[user_id].get("directions", [])
+    keyboard = BotKeyboards.get_directions_keyboard(directions)
+    # Без флага needs_data: пока данных нет, карточки не готовим
+    if tenant.has_data:
+        schedule_cards_prefetch(tenant, user_id)
     await callback.message.edit_text(
         "🎯 Вот подходящие направления:",
-        reply_markup=BotKeyboards.get_directions_keyboard(directions)
+        reply_markup=keyboard
     )
 
 @router.callback_query(F.data == "exit")
-async def exit_handler(callback: CallbackQuery):
+async def exit_handler(callback: CallbackQuery, tenant: Tenant):
+    user_data = tenant.user_data
     user_id = callback.from_user.id
     if user_id in user_data:
         del user_data[user_id]
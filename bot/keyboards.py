@@ -2,6 +2,7 @@ from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from typing import Optional, List, Dict
 import re
 from urllib.parse import quote
+from bot.utils import extract_direction_code
 
 def safe_callback_data(text: str, prefix: str = "") -> str:
     # Удаляем недопустимые символы
@@ -74,11 +75,14 @@ class BotKeyboards:
         buttons.append(controls)
 
     @classmethod
-    def get_form_keyboard(cls, selected_form: Optional[str] = None) -> InlineKeyboardMarkup:
-        """Клавиатура выбора формы обучения"""
+    def get_form_keyboard(cls, selected_form: Optional[str] = None,
+                          forms: Optional[List[str]] = None) -> InlineKeyboardMarkup:
+        """Клавиатура выбора формы обучения (forms — доступные формы, по умолчанию все)"""
         buttons = []
 
         for text, callback_data in cls._EDU_FORMS:
+            if forms is not None and text not in forms:
+                continue
             if selected_form and callback_data.split(":")[1] == selected_form:
                 text = f"✅ {text}"
             buttons.append([InlineKeyboardButton(
@@ -96,13 +100,14 @@ class BotKeyboards:
         return InlineKeyboardMarkup(inline_keyboard=buttons)
 
     @classmethod
-    def get_subjects_keyboard(cls, selected_subjects: Optional[List[str]] = None) -> InlineKeyboardMarkup:
-        """Клавиатура выбора предметов"""
+    def get_subjects_keyboard(cls, selected_subjects: Optional[List[str]] = None,
+                              subjects: Optional[List[str]] = None) -> InlineKeyboardMarkup:
+        """Клавиатура выбора предметов (subjects — свой список предметов бота)"""
         selected_subjects = selected_subjects or []
         buttons = []
         row = []
 
-        for subject in cls._SUBJECTS:
+        for subject in subjects or cls._SUBJECTS:
             prefix = "✅ " if subject in selected_subjects else ""
             row.append(InlineKeyboardButton(
                 text=f"{prefix}{subject}",
@@ -139,8 +144,7 @@ class BotKeyboards:
         buttons = []
         for direction in directions:
             # Извлекаем код направления (до первого пробела или точки)
-            code_match = re.match(r'^\s*(\d+\.\d+\.\d+)', direction.strip())
-            code = code_match.group(1) if code_match else direction[:10]
+            code = extract_direction_code(direction)
 
             # Для отображения: обрезаем длинные строки
             display_text = direction[:30] + "..." if len(direction) > 30 else direction
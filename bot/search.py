@@ -0,0 +1,167 @@
+import html
+import logging
+import re
+from collections import defaultdict
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from bot.utils import DataSnapshot, extract_direction_code, get_snapshot, snapshot_cache
+
+logger = logging.getLogger(__name__)
+
+# Константы
+SEARCH_LIMIT = 10           # Максимум результатов на запрос
+SEARCH_CACHE_SIZE = 512     # Размер LRU-кэша запросов
+MIN_TRIGRAM_SCORE = 0.6     # Доля совпавших триграмм запроса
+
+
+class DirectionEntry(NamedTuple):
+    """Направление в поисковом индексе"""
+    code: str
+    name: str
+    forms: Tuple[str, ...]
+    subjects: str
+
+
+# -------------------------------
+# Нормализация текста
+# -------------------------------
+
+def normalize_search_text(text: str) -> str:
+    """Приводит текст к виду для поиска: нижний регистр, ё → е, без знаков"""
+    text = str(text).lower().replace("ё", "е")
+    text = re.sub(r'[^a-zа-я0-9.\s]', ' ', text)
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def text_trigrams(text: str, partial_last: bool = False) -> Set[str]:
+    """Триграммы всех слов текста (слова дополняются пробелами).
+
+    При partial_last последнее слово считается недописанным префиксом
+    и не дополняется пробелом справа.
+    """
+    trigrams = set()
+    tokens = text.split()
+    for position, token in enumerate(tokens):
+        is_last = position == len(tokens) - 1
+        padded = f" {token}" if partial_last and is_last else f" {token} "
+        trigrams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return trigrams
+
+
+# -------------------------------
+# Поисковый индекс
+# -------------------------------
+
+class DirectionSearchIndex:
+    """Триграммный индекс по названиям, кодам и предметам направлений"""
+
+    def __init__(self, entries: List[DirectionEntry]):
+        self.entries = entries
+        self._names: List[str] = []
+        self._trigrams: Dict[str, Set[int]] = defaultdict(set)
+        self._prefixes: Dict[str, Set[int]] = defaultdict(set)
+
+        for entry_id, entry in enumerate(entries):
+            name = normalize_search_text(entry.name)
+            text = f"{name} {normalize_search_text(entry.subjects)}"
+            self._names.append(name)
+
+            for trigram in text_trigrams(text):
+                self._trigrams[trigram].add(entry_id)
+
+            # Короткие запросы (1–2 символа) ищутся по префиксам слов
+            for token in text.split():
+                for size in (1, 2):
+                    self._prefixes[token[:size]].add(entry_id)
+
+    @classmethod
+    def from_snapshot(cls, snapshot: DataSnapshot) -> "DirectionSearchIndex":
+        """Строит индекс по всем листам снимка данных"""
+        entries: Dict[str, dict] = {}
+
+        for form, df in snapshot.sheets.items():
+            for _, row in df.iterrows():
+                direction = str(row["Направление"]).strip()
+                if not direction or direction == "-":
+                    continue
+
+                # Тот же код, что у клавиатуры и кэша карточек
+                entry = entries.setdefault(extract_direction_code(direction), {
+                    "name": re.sub(r'\s*—\s*', ' ', direction),
+                    "forms": [],
+                    "subjects": "-",
+                })
+                if form not in entry["forms"]:
+                    entry["forms"].append(form)
+
+                subjects = str(row.get("Предметы", "-")).strip()
+                if entry["subjects"] == "-" and subjects:
+                    entry["subjects"] = subjects
+
+        index = cls([
+            DirectionEntry(code, data["name"], tuple(data["forms"]), data["subjects"])
+            for code, data in sorted(entries.items())
+        ])
+        logger.info(f"Поисковый индекс построен: {len(index.entries)} направлений")
+        return index
+
+    def search(self, query: str, limit: int = SEARCH_LIMIT) -> List[DirectionEntry]:
+        """Ищет направления по запросу, лучшие совпадения — первыми"""
+        query = normalize_search_text(query)
+        if not query:
+            return []
+
+        if len(query) < 3:
+            candidates = {entry_id: 1.0 for entry_id in self._prefixes.get(query, ())}
+        else:
+            trigrams = text_trigrams(query, partial_last=True)
+            hits: Dict[int, int] = defaultdict(int)
+            for trigram in trigrams:
+                for entry_id in self._trigrams.get(trigram, ()):
+                    hits[entry_id] += 1
+            candidates = {
+                entry_id: count / len(trigrams)
+                for entry_id, count in hits.items()
+                if count / len(trigrams) >= MIN_TRIGRAM_SCORE
+            }
+
+        # Совпадение в названии важнее совпадения в предметах
+        ranked = sorted(
+            candidates,
+            key=lambda entry_id: (
+                -candidates[entry_id],
+                query not in self._names[entry_id],
+                self.entries[entry_id].code,
+            )
+        )
+        return [self.entries[entry_id] for entry_id in ranked[:limit]]
+
+
+def get_search_index(snapshot: Optional[DataSnapshot] = None) -> DirectionSearchIndex:
+    """Возвращает индекс снимка данных; строится один раз на снимок"""
+    return _build_index(snapshot or get_snapshot())
+
+
+@snapshot_cache(maxsize=16)
+def _build_index(snapshot: DataSnapshot) -> DirectionSearchIndex:
+    return DirectionSearchIndex.from_snapshot(snapshot)
+
+
+@snapshot_cache(maxsize=SEARCH_CACHE_SIZE)
+def _cached_search(index: DirectionSearchIndex, query: str, limit: int) -> Tuple[DirectionEntry, ...]:
+    return tuple(index.search(query, limit))
+
+
+def search_directions(query: str, limit: int = SEARCH_LIMIT,
+                      snapshot: Optional[DataSnapshot] = None) -> Tuple[DirectionEntry, ...]:
+    """Поиск направлений с LRU-кэшем по нормализованному запросу"""
+    return _cached_search(get_search_index(snapshot), normalize_search_text(query), limit)
+
+
+def format_direction_entry(entry: DirectionEntry) -> str:
+    """HTML-описание направления для ответа на поиск"""
+    return (
+        f"🎓 <b>{html.escape(entry.name)}</b>\n"
+        f"📋 <b>Формы обучения:</b> {html.escape(', '.join(entry.forms))}\n"
+        f"📘 <b>Предметы:</b> {html.escape(entry.subjects)}"
+    )
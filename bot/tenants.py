@@ -0,0 +1,249 @@
+"""Несколько ботов (учебных заведений) в одном процессе.
+
+Файл конфигурации (TENANTS_FILE) — JSON:
+
+    {
+        "tenants": [
+            {
+                "name": "sum",
+                "token_env": "SUM_BOT_TOKEN",
+                "data_file": "data/directions.xlsx",
+                "form_to_sheet": {"очная бюджет": "очная бюджет"},
+                "subjects": ["Профильная математика", "Информатика"]
+            }
+        ]
+    }
+
+Токен задаётся через переменную окружения (token_env) или напрямую (token).
+Пути к файлам данных считаются от каталога файла конфигурации.
+form_to_sheet и subjects необязательны: по умолчанию — как у основного бота.
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import Counter
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.types import CallbackQuery, InlineQuery, Message, TelegramObject, Update
+from aiogram.types.update import UpdateTypeLookupError
+
+from bot.search import get_search_index
+from bot.utils import EXCEL_FILE, FORM_TO_SHEET, DataSnapshot, get_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Константы
+DATA_WAIT_TIMEOUT = 5       # Секунды, которые запрос ждёт загрузки данных
+DATA_RETRY_INTERVAL = 60    # Секунды между попытками загрузить данные после ошибки
+DATA_CHECK_INTERVAL = 30    # Секунды между проверками изменения файла данных
+
+DATA_LOADING = "loading"
+DATA_READY = "ready"
+DATA_STALE = "stale"        # Новый файл не прочитан, бот работает на прежних данных
+DATA_ERROR = "error"
+
+
+class Tenant:
+    """Бот одного учебного заведения: токен, данные, сессии и счётчики"""
+
+    def __init__(self, name: str, token: str, data_file: Path = EXCEL_FILE,
+                 form_to_sheet: Optional[Dict[str, str]] = None,
+                 subjects: Optional[List[str]] = None):
+        self.name = name
+        self.token = token
+        self.data_file = Path(data_file)
+        self.form_to_sheet = dict(form_to_sheet or FORM_TO_SHEET)
+        self.subjects = list(subjects) if subjects else None
+        self.user_data: Dict[int, dict] = {}  # user_id -> сессия пользователя
+        self.metrics: Counter = Counter()
+
+        # Состояние данных: loading -> ready; ошибка чтения даёт error,
+        # а если прежние данные уже есть — stale до следующей успешной загрузки
+        self.data_state = DATA_LOADING
+        self.data_error: Optional[str] = None
+        self.data_checked = asyncio.Event()  # Установлено после первой попытки загрузки
+        self._snapshot: Optional[DataSnapshot] = None
+
+        for form in self.form_to_sheet:
+            if form not in FORM_TO_SHEET:
+                raise ValueError(f"Бот {name}: неизвестная форма обучения «{form}»")
+
+    @property
+    def forms(self) -> List[str]:
+        return list(self.form_to_sheet)
+
+    @property
+    def has_data(self) -> bool:
+        """Есть ли загруженные данные (в том числе прежние)"""
+        return self._snapshot is not None
+
+    def get_snapshot(self) -> DataSnapshot:
+        """Текущий снимок данных бота; файл не читается.
+
+        Снимок обновляет фоновая задача load_data, поэтому вызов
+        не блокирует цикл событий.
+        """
+        if self._snapshot is None:
+            raise ValueError(self.data_error or "Данные о направлениях ещё загружаются")
+        return self._snapshot
+
+    def refresh_data(self) -> None:
+        """Перечитывает файл данных, если он изменился (в фоновом потоке).
+
+        Одинаковые файлы разных ботов дают общий снимок. Если изменённый
+        файл не удалось прочитать, остаётся прежний снимок.
+        """
+        try:
+            snapshot = get_snapshot(self.data_file, self.form_to_sheet)
+            get_search_index(snapshot)
+        except Exception as e:
+            if self.data_error != str(e):
+                if self._snapshot is None:
+                    logger.error(f"Бот {self.name}: данные не загружены: {str(e)}")
+                else:
+                    logger.error(f"Бот {self.name}: используются прежние данные: {str(e)}")
+            self.data_state = DATA_STALE if self._snapshot is not None else DATA_ERROR
+            self.data_error = str(e)
+            return
+
+        if snapshot is not self._snapshot:
+            logger.info(f"Бот {self.name}: данные загружены ({snapshot.version})")
+        self._snapshot = snapshot
+        self.data_state = DATA_READY
+        self.data_error = None
+
+    async def load_data(self) -> None:
+        """Загружает данные в фоне и затем следит за изменениями файла"""
+        while True:
+            await asyncio.to_thread(self.refresh_data)
+            self.data_checked.set()
+            await asyncio.sleep(DATA_CHECK_INTERVAL if self.has_data else DATA_RETRY_INTERVAL)
+
+    def health(self) -> Dict[str, Any]:
+        """Состояние данных бота для проверки работоспособности"""
+        state = {"state": self.data_state}
+        if self._snapshot is not None:
+            state["version"] = self._snapshot.version
+        if self.data_error:
+            state["error"] = self.data_error
+        return state
+
+
+def default_tenant() -> Tenant:
+    """Единственный бот из BOT_TOKEN и стандартных данных"""
+    token = os.getenv("BOT_TOKEN")
+    if not token:
+        raise ValueError("Токен бота не найден. Проверьте .env")
+    return Tenant("default", token)
+
+
+def load_tenants(config_path: Path) -> List[Tenant]:
+    """Читает список ботов из JSON-файла конфигурации"""
+    try:
+        config = json.loads(config_path.read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError) as e:
+        raise ValueError(f"Ошибка чтения конфигурации {config_path}: {str(e)}")
+
+    items = config.get("tenants", []) if isinstance(config, dict) else None
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise ValueError(f"{config_path}: ожидается объект с полем tenants (список ботов)")
+
+    tenants = []
+    for item in items:
+        name = item.get("name") or f"tenant{len(tenants) + 1}"
+        token = os.getenv(item["token_env"]) if "token_env" in item else item.get("token")
+        if not token:
+            raise ValueError(f"Бот {name}: токен не задан")
+
+        # Боты различаются по bot.id (начало токена) и по имени в ?tenant= API
+        for other in tenants:
+            if other.name == name:
+                raise ValueError(f"Бот {name}: имя уже используется")
+            if other.token.split(":")[0] == token.split(":")[0]:
+                raise ValueError(f"Бот {name}: тот же токен, что у бота {other.name}")
+
+        data_file = Path(item["data_file"]) if "data_file" in item else EXCEL_FILE
+        if not data_file.is_absolute():
+            data_file = config_path.parent / data_file
+
+        tenants.append(Tenant(
+            name,
+            token,
+            data_file=data_file,
+            form_to_sheet=item.get("form_to_sheet"),
+            subjects=item.get("subjects")
+        ))
+
+    if not tenants:
+        raise ValueError(f"В {config_path} не описано ни одного бота")
+    return tenants
+
+
+class TenantMiddleware(BaseMiddleware):
+    """Передаёт обработчикам бота его Tenant и ведёт счётчики по ботам"""
+
+    def __init__(self, tenants: Dict[int, Tenant]):
+        self.tenants = tenants  # bot.id -> Tenant
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        tenant = self.tenants[data["bot"].id]
+        data["tenant"] = tenant
+
+        if isinstance(event, Update):
+            try:
+                tenant.metrics[event.event_type] += 1
+            except UpdateTypeLookupError:
+                tenant.metrics["unknown"] += 1
+        try:
+            return await handler(event, data)
+        except Exception:
+            tenant.metrics["errors"] += 1
+            raise
+
+
+class DataReadyMiddleware(BaseMiddleware):
+    """Придерживает обработчики с флагом needs_data, пока данных бота нет.
+
+    Прежние данные (stale) считаются пригодными. Запрос ждёт загрузки
+    не дольше DATA_WAIT_TIMEOUT, затем пользователь получает сообщение
+    о загрузке или о недоступности данных.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        tenant: Tenant = data["tenant"]
+        if not get_flag(data, "needs_data") or tenant.has_data:
+            return await handler(event, data)
+
+        if not tenant.data_checked.is_set():
+            try:
+                await asyncio.wait_for(tenant.data_checked.wait(), DATA_WAIT_TIMEOUT)
+            except asyncio.TimeoutError:
+                pass
+            if tenant.has_data:
+                return await handler(event, data)
+
+        if tenant.data_state == DATA_LOADING:
+            text = "⏳ Данные о направлениях загружаются. Попробуйте через минуту."
+        else:
+            text = "⚠️ Данные о направлениях временно недоступны. Попробуйте позже."
+
+        if isinstance(event, CallbackQuery):
+            await event.answer(text, show_alert=True)
+        elif isinstance(event, Message):
+            await event.answer(text)
+        elif isinstance(event, InlineQuery):
+            await event.answer([], cache_time=0, is_personal=True)
@@ -1,8 +1,12 @@
 import pandas as pd
 from pathlib import Path
+from functools import lru_cache
+import hashlib
+import html
 import logging
-from typing import List, Set, Dict, Optional, Union
+from typing import Any, Callable, FrozenSet, List, Set, Dict, Optional, Tuple, Union
 import re
+import weakref
 
 # Настройка логирования
 logging.basicConfig(
@@ -27,13 +31,13 @@ FORM_TO_SHEET = {
 # Чтение и обработка данных Excel
 # -------------------------------
 
-def load_sheet(sheet_name: str) -> pd.DataFrame:
+def load_sheet(sheet_name: str, path: Path = EXCEL_FILE) -> pd.DataFrame:
     """Загружает данные листа Excel"""
     try:
-        if not EXCEL_FILE.exists():
-            raise FileNotFoundError(f"Файл {EXCEL_FILE} не найден")
+        if not path.exists():
+            raise FileNotFoundError(f"Файл {path} не найден")
 
-        df = pd.read_excel(EXCEL_FILE, sheet_name=sheet_name, header=None, engine='openpyxl')
+        df = pd.read_excel(path, sheet_name=sheet_name, header=None, engine='openpyxl')
         if df.empty:
             raise ValueError("Лист пустой")
 
@@ -44,12 +48,14 @@ def load_sheet(sheet_name: str) -> pd.DataFrame:
         raise ValueError(f"Ошибка загрузки данных: {str(e)}")
 
 
-def parse_directions_sheet(sheet_name: str) -> pd.DataFrame:
+def parse_directions_sheet(sheet_name: str, path: Path = EXCEL_FILE) -> pd.DataFrame:
     """Обрабатывает лист с направлениями обучения"""
-    df = load_sheet(sheet_name)
+    df = load_sheet(sheet_name, path)
 
     # Установка заголовков
     headers = df.iloc[0].fillna('').astype(str).str.strip()
+    if "Направление" not in headers.values:
+        raise ValueError(f"Ошибка загрузки данных: на листе {sheet_name} нет столбца «Направление»")
     df.columns = headers
     df = df.iloc[1:]
 
@@ -66,6 +72,121 @@ def parse_directions_sheet(sheet_name: str) -> pd.DataFrame:
     return df
 
 
+# -------------------------------
+# Снимок данных
+# -------------------------------
+
+class DataSnapshot:
+    """Все листы с направлениями, разобранные один раз.
+
+    version — хэш содержимого файла; по нему кэшируются производные данные
+    (поисковый индекс, результаты подбора, ETag в HTTP API).
+    """
+
+    def __init__(self, version: str, sheets: Dict[str, pd.DataFrame]):
+        self.version = version
+        self.sheets = sheets
+
+
+# Снимки с одинаковым содержимым файла и листами общие для всех ботов процесса
+_snapshots: "weakref.WeakValueDictionary[Tuple, DataSnapshot]" = weakref.WeakValueDictionary()
+_loaded: Dict[Tuple, Tuple[Optional[int], DataSnapshot]] = {}
+_failed: Dict[Tuple, Tuple[Optional[int], str]] = {}
+_snapshot_caches: List[Callable] = []
+
+
+def snapshot_cache(maxsize: int) -> Callable:
+    """lru_cache для данных, производных от снимка.
+
+    Кэши держат снимки по сильным ссылкам, поэтому при замене снимка
+    они очищаются — иначе прежние таблицы остаются в памяти до вытеснения.
+    """
+    def decorator(func: Callable) -> Callable:
+        cached = lru_cache(maxsize=maxsize)(func)
+        _snapshot_caches.append(cached)
+        return cached
+    return decorator
+
+
+def clear_snapshot_caches() -> None:
+    """Очищает кэши производных данных всех снимков"""
+    for cached in _snapshot_caches:
+        cached.cache_clear()
+
+
+def load_snapshot(path: Path = EXCEL_FILE, form_to_sheet: Optional[Dict[str, str]] = None) -> DataSnapshot:
+    """Читает файл данных и разбирает листы всех форм обучения.
+
+    Если такой же файл с теми же листами уже загружен, возвращает готовый снимок.
+    """
+    form_to_sheet = form_to_sheet or FORM_TO_SHEET
+    if not path.exists():
+        raise ValueError(f"Ошибка загрузки данных: файл {path} не найден")
+
+    version = hashlib.sha1(path.read_bytes()).hexdigest()[:16]
+    key = (version, tuple(sorted(form_to_sheet.items())))
+    snapshot = _snapshots.get(key)
+    if snapshot is not None:
+        return snapshot
+
+    sheets = {
+        form: parse_directions_sheet(sheet_name, path)
+        for form, sheet_name in form_to_sheet.items()
+    }
+
+    snapshot = DataSnapshot(version, sheets)
+    _snapshots[key] = snapshot
+    logger.info(f"Загружен снимок данных {version} из {path}")
+    return snapshot
+
+
+def get_snapshot(path: Path = EXCEL_FILE, form_to_sheet: Optional[Dict[str, str]] = None) -> DataSnapshot:
+    """Возвращает текущий снимок, перечитывая файл при его изменении"""
+    form_to_sheet = form_to_sheet or FORM_TO_SHEET
+    key = (path.resolve(), tuple(sorted(form_to_sheet.items())))
+
+    mtime = path.stat().st_mtime_ns if path.exists() else None
+    loaded = _loaded.get(key)
+    if loaded is not None and loaded[0] == mtime:
+        return loaded[1]
+
+    # Неудачная загрузка запоминается: тот же файл повторно не разбирается
+    failed = _failed.get(key)
+    if failed is not None and failed[0] == mtime:
+        raise ValueError(failed[1])
+
+    try:
+        snapshot = load_snapshot(path, form_to_sheet)
+    except ValueError as e:
+        _failed[key] = (mtime, str(e))
+        raise
+
+    _failed.pop(key, None)
+    previous = _loaded.get(key)
+    _loaded[key] = (mtime, snapshot)
+
+    # Прежний снимок больше не текущий: освобождаем его вместе с кэшами
+    if previous is not None and previous[1] is not snapshot:
+        clear_snapshot_caches()
+    return snapshot
+
+
+def resolve_form(form: str, snapshot: DataSnapshot) -> str:
+    """Нормализует форму обучения и проверяет, что она есть в данных"""
+    normalized_form = normalize_form(form)
+    if not normalized_form:
+        raise ValueError(f"Неизвестная форма обучения: {form}")
+    if normalized_form not in snapshot.sheets:
+        raise ValueError(f"Форма обучения «{normalized_form}» недоступна")
+    return normalized_form
+
+
+def get_form_directions(form: str, snapshot: Optional[DataSnapshot] = None) -> pd.DataFrame:
+    """Возвращает таблицу направлений для формы обучения"""
+    snapshot = snapshot or get_snapshot()
+    return snapshot.sheets[resolve_form(form, snapshot)]
+
+
 # -------------------------------
 # Нормализация данных
 # -------------------------------
@@ -165,17 +286,24 @@ def find_matching_subjects(selected: Set[str], required: Set[str]) -> Set[str]:
     return matched
 
 
-def get_directions_data(selected_subjects: List[str], form: str) -> List[str]:
+def get_directions_data(selected_subjects: List[str], form: str,
+                        snapshot: Optional[DataSnapshot] = None) -> List[str]:
     """Основная функция поиска подходящих направлений"""
-    normalized_form = normalize_form(form)
-    if not normalized_form:
-        raise ValueError(f"Неизвестная форма обучения: {form}")
-
-    sheet_name = FORM_TO_SHEET[normalized_form]
-    df = parse_directions_sheet(sheet_name)
+    snapshot = snapshot or get_snapshot()
+    normalized_form = resolve_form(form, snapshot)
 
     # Нормализуем выбранные предметы
-    selected_normalized = {normalize_subject_name(s) for s in selected_subjects}
+    selected_normalized = frozenset(normalize_subject_name(s) for s in selected_subjects)
+    result = list(_match_directions(snapshot, normalized_form, selected_normalized))
+
+    logger.info(f"Для предметов {selected_subjects} найдено {len(result)} направлений")
+    return result
+
+
+@snapshot_cache(maxsize=256)
+def _match_directions(snapshot: DataSnapshot, form: str, selected: FrozenSet[str]) -> Tuple[str, ...]:
+    """Подбор направлений, кэшируемый по снимку, форме и предметам"""
+    df = snapshot.sheets[form]
     result = []
 
     for _, row in df.iterrows():
@@ -186,7 +314,7 @@ def get_directions_data(selected_subjects: List[str], form: str) -> List[str]:
         required_subjects = extract_required_subjects(subjects_str)
 
         # Находим совпадения
-        matched = find_matching_subjects(selected_normalized, required_subjects)
+        matched = find_matching_subjects(selected, required_subjects)
 
         # Проверяем наличие математики
         has_math = any("математика" in subj for subj in matched)
@@ -195,22 +323,33 @@ def get_directions_data(selected_subjects: List[str], form: str) -> List[str]:
         if len(matched) >= 2 and has_math:
             result.append(direction)
 
-    logger.info(f"Для предметов {selected_subjects} найдено {len(result)} направлений")
-    return result
+    return tuple(result)
 
 
 # -------------------------------
 # Расчет шансов поступления
 # -------------------------------
 
-def calculate_chance(user_score: int, direction_code: str, form: str) -> str:
-    normalized_form = normalize_form(form)
-    if not normalized_form:
-        raise ValueError(f"Неизвестная форма обучения: {form}")
+CHANCE_LABELS = {
+    "high": "🟢 Высокие",
+    "medium": "🟡 Средние",
+    "low": "🔴 Низкие",
+    "unknown": "⚪ Нет данных"
+}
+
+
+def _cell_value(value: Any) -> Any:
+    """Приводит значение ячейки pandas/numpy к обычному типу Python"""
+    return value.item() if hasattr(value, "item") else value
+
 
-    sheet_name = FORM_TO_SHEET[normalized_form]
-    df = parse_directions_sheet(sheet_name)
+def get_direction_info(direction_code: str, form: str,
+                       snapshot: Optional[DataSnapshot] = None) -> Dict[str, Any]:
+    """Возвращает данные направления из таблицы по его коду"""
+    return _find_direction_info(get_form_directions(form, snapshot), direction_code)
 
+
+def _find_direction_info(df: pd.DataFrame, direction_code: str) -> Dict[str, Any]:
     # Ищем направление по коду
     code_pattern = re.escape(direction_code.strip())
     direction_row = df[df["Направление"].str.contains(code_pattern, case=False, na=False)]
@@ -222,38 +361,101 @@ def calculate_chance(user_score: int, direction_code: str, form: str) -> str:
     direction = direction_row.iloc[0]
 
     # Получаем данные из таблицы
-    score_2022 = direction.get("Год 2022", "-")
-    score_23 = direction.get("Год 2023", "-")
-    score_24 = direction.get("Год 2024", "-")
-    budget_places = direction.get("Кол-во бюджетных мест всего", "-")
-    quota_target = direction.get("квота приема на целевое обучение", "-")
-    quota_special = direction.get("особая квота", "-")
-    quota_separate = direction.get("отдельная квота", "-")
-    high_score = direction.get("Высокие", 0)
-    mid_score = direction.get("Средние", 0)
-
-    # Определяем шансы
+    return {
+        "direction": _cell_value(direction["Направление"]),
+        "scores": {
+            year: _cell_value(direction.get(f"Год {year}", "-"))
+            for year in ("2022", "2023", "2024")
+        },
+        "budget_places": _cell_value(direction.get("Кол-во бюджетных мест всего", "-")),
+        "quota_target": _cell_value(direction.get("квота приема на целевое обучение", "-")),
+        "quota_special": _cell_value(direction.get("особая квота", "-")),
+        "quota_separate": _cell_value(direction.get("отдельная квота", "-")),
+        "high_score": _cell_value(direction.get("Высокие", 0)),
+        "mid_score": _cell_value(direction.get("Средние", 0))
+    }
+
+
+def estimate_chance(user_score: int, high_score: Any, mid_score: Any) -> str:
+    """Оценивает шансы: high, medium, low или unknown (нет данных)"""
+    try:
+        high_score, mid_score = float(high_score), float(mid_score)
+    except (TypeError, ValueError):
+        return "unknown"
+
     if user_score >= high_score:
-        chance = "🟢 Высокие"
+        return "high"
     elif user_score >= mid_score:
-        chance = "🟡 Средние"
-    else:
-        chance = "🔴 Низкие"
+        return "medium"
+    return "low"
+
+
+def calculate_chance(user_score: int, direction_code: str, form: str,
+                     snapshot: Optional[DataSnapshot] = None) -> str:
+    static_text, high_score, mid_score = get_direction_card_base(direction_code, form, snapshot)
+    return render_direction_card(static_text, estimate_chance(user_score, high_score, mid_score))
+
+
+# -------------------------------
+# Карточки направлений
+# -------------------------------
+
+def extract_direction_code(direction: str) -> str:
+    """Код направления (например, 38.03.01) из его названия"""
+    code_match = re.match(r'^\s*(\d+\.\d+\.\d+)', direction.strip())
+    return code_match.group(1) if code_match else direction[:10]
+
+
+def format_direction_static(info: Dict[str, Any]) -> str:
+    """Неизменная часть карточки направления: баллы, места, квоты"""
+    def value(key: str) -> str:
+        return html.escape(str(info[key]))
+
+    scores = {year: html.escape(str(score)) for year, score in info["scores"].items()}
 
     # Формируем ответ без вывода кода направления
     return f"""
 📊 <b>Проходные баллы:</b>
-- 2022: {score_2022}
-- 2023: {score_23}
-- 2024: {score_24}
+- 2022: {scores["2022"]}
+- 2023: {scores["2023"]}
+- 2024: {scores["2024"]}
+
+👥 <b>Количество мест:</b> {value("budget_places")}
+🎯 <b>Целевая квота:</b> {value("quota_target")}
+🎖 <b>Особая квота:</b> {value("quota_special")}
+🎖 <b>Отдельная квота:</b> {value("quota_separate")}
+""".strip()
 
-👥 <b>Количество мест:</b> {budget_places}
-🎯 <b>Целевая квота:</b> {quota_target}
-🎖 <b>Особая квота:</b> {quota_special}
-🎖 <b>Отдельная квота:</b> {quota_separate}
 
-📈 <b>Ваши шансы:</b> {chance}
-""".strip()
+def render_direction_card(static_text: str, chance: str) -> str:
+    """Полная карточка: неизменная часть и шансы абитуриента"""
+    return f"{static_text}\n\n📈 <b>Ваши шансы:</b> {CHANCE_LABELS[chance]}"
+
+
+@snapshot_cache(maxsize=1024)
+def _direction_card_base(snapshot: DataSnapshot, form: str, direction_code: str) -> Tuple[str, Any, Any]:
+    info = _find_direction_info(snapshot.sheets[form], direction_code)
+    return format_direction_static(info), info["high_score"], info["mid_score"]
+
+
+def get_direction_card_base(direction_code: str, form: str,
+                            snapshot: Optional[DataSnapshot] = None) -> Tuple[str, Any, Any]:
+    """Неизменная часть карточки и пороги шансов; считается раз на снимок данных"""
+    snapshot = snapshot or get_snapshot()
+    return _direction_card_base(snapshot, resolve_form(form, snapshot), direction_code.strip())
+
+
+def render_direction_cards(directions: List[str], user_score: int, form: str,
+                           snapshot: Optional[DataSnapshot] = None) -> Dict[str, str]:
+    """Готовые карточки для списка направлений: код -> текст"""
+    cards = {}
+    for direction in directions:
+        code = extract_direction_code(direction)
+        try:
+            cards[code] = calculate_chance(user_score, code, form, snapshot)
+        except ValueError:
+            continue
+    return cards
 
 
 # -------------------------------
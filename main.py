@@ -4,6 +4,7 @@ from aiogram.client.bot import DefaultBotProperties
 from aiogram.fsm.storage.memory import MemoryStorage
 from aiogram.utils.chat_action import ChatActionMiddleware
 from dotenv import load_dotenv
+from pathlib import Path
 import logging
 import os
 
@@ -11,27 +12,52 @@ load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 
-TOKEN = os.getenv("BOT_TOKEN")
-if not TOKEN:
-    raise ValueError("Токен бота не найден. Проверьте .env")
+from bot.handlers import router
+from bot.api import start_api
+from bot.tenants import DataReadyMiddleware, TenantMiddleware, default_tenant, load_tenants
+
+# Несколько ботов в одном процессе (см. bot/tenants.py), иначе — один бот из BOT_TOKEN
+TENANTS_FILE = os.getenv("TENANTS_FILE")
+tenants = load_tenants(Path(TENANTS_FILE)) if TENANTS_FILE else [default_tenant()]
 
-bot = Bot(
-    token=TOKEN,
-    default=DefaultBotProperties(parse_mode="HTML")
-)
+bots = [
+    Bot(
+        token=tenant.token,
+        default=DefaultBotProperties(parse_mode="HTML")
+    )
+    for tenant in tenants
+]
 
 storage = MemoryStorage()
 dp = Dispatcher(storage=storage)
 
-from bot.handlers import router
+dp.update.outer_middleware(TenantMiddleware({bot.id: tenant for bot, tenant in zip(bots, tenants)}))
 dp.include_router(router)
 
+# HTTP API в том же процессе (отдельно: python -m bot.api)
+API_ENABLED = os.getenv("API_ENABLED", "false").lower() in ("true", "1", "yes")
+
 async def main():
+    # Данные и поисковый индекс загружаются в фоне, бот начинает опрос сразу;
+    # боты с одинаковыми данными используют общий снимок и индекс
+    load_tasks = [asyncio.create_task(tenant.load_data()) for tenant in tenants]
+
     print("Bot started...")
 
     dp.message.middleware(ChatActionMiddleware())
+    for observer in (dp.message, dp.callback_query, dp.inline_query):
+        observer.middleware(DataReadyMiddleware())
 
-    await dp.start_polling(bot)
+    api_runner = await start_api(tenants=tenants) if API_ENABLED else None
+    try:
+        await dp.start_polling(*bots)
+    finally:
+        for task in load_tasks:
+            task.cancel()
+        for tenant in tenants:
+            logging.info(f"Бот {tenant.name}: {dict(tenant.metrics)}")
+        if api_runner:
+            await api_runner.cleanup()
 
 if __name__ == "__main__":
     try: